@@ -1,13 +1,42 @@
 import functions_framework
+import logging
 import os
 import json
+import re
+import time
 import uuid
+import httpx
 import requests
-from datetime import date, timedelta
-from google.cloud import secretmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
 from notion_client import Client
+from notion_client.errors import HTTPResponseError
+from requests.adapters import HTTPAdapter
 from todoist_api_python.api import TodoistAPI
 from todoist_api_python.models import Project
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+
+    def json_dumps(obj):
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            # orjson rejects lone surrogates (e.g. a "\ud800" escape in a
+            # request body echoed back into a response); stdlib json accepts
+            # them, so keep the baseline behavior for those payloads.
+            return json.dumps(obj)
+
+    json_loads = orjson.loads
+except ImportError:
+    json_dumps = json.dumps
+    json_loads = json.loads
+
+# Per-item traces log at DEBUG so production (INFO) runs emit a handful of
+# phase summaries instead of one synchronous stdout write per page.
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
 
 # --- Configuration ---
 PROJECT_ID = "notion-todoist-sync-464419"  # Secret Manager project
@@ -16,8 +45,11 @@ NOTION_TASKS_DB_ID = "21d89c4a21dd80f0a679e685cc7a3496"
 NOTION_TODOIST_TASKS_DB_ID = "28789c4a21dd801bac9afec0722348a0"
 NOTION_SECRET_NAME = "notion-api-key"
 TODOIST_SECRET_NAME = "todoist-api-key"
-ACTIVE_NOTION_STATUSES = {"Planning", "In Progress", "Ongoing"}
+ACTIVE_NOTION_STATUSES = frozenset({"Planning", "In Progress", "Ongoing"})
 TODOIST_SYNC_URL = "https://api.todoist.com/api/v1/sync"
+# (connect, read) timeout: a hung connection fails in ~3s instead of
+# consuming the function's whole billable timeout budget.
+REQUEST_TIMEOUT = (3.05, 30)
 
 PARA_LABELS = [
     "PROSPER \ud83d\udcc1",
@@ -28,59 +60,174 @@ PARA_LABELS = [
     "FINANCIAL \ud83d\udcc1",
     "FUN \ud83d\udcc1",
 ]
+# Set/order views of PARA_LABELS for the per-task matching loop: membership
+# via C-level set intersection, ties broken by PARA_LABELS ordering.
+_PARA_SET = frozenset(PARA_LABELS)
+_PARA_ORDER = {label: i for i, label in enumerate(PARA_LABELS)}
+
+# Module-level session so warm Cloud Function instances reuse pooled
+# keep-alive connections instead of paying a TCP+TLS handshake per call.
+_todoist_session = requests.Session()
+_todoist_session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "POST"],
+        ),
+    ),
+)
+
+# Static response headers, built once instead of per request.
+CORS_HEADERS = {"Access-Control-Allow-Origin": "*"}
+CORS_JSON_HEADERS = {**CORS_HEADERS, "Content-Type": "application/json"}
+CORS_PREFLIGHT_GET = {**CORS_HEADERS, "Access-Control-Allow-Methods": "GET", "Access-Control-Allow-Headers": "Content-Type"}
+CORS_PREFLIGHT_POST = {**CORS_HEADERS, "Access-Control-Allow-Methods": "POST", "Access-Control-Allow-Headers": "Content-Type"}
 
 # --- Helper Functions ---
 
+def json_response(payload, status=200):
+    """Builds a JSON CORS response tuple for the HTTP entry points."""
+    return (json_dumps(payload), status, CORS_JSON_HEADERS)
+
+
+def json_error(message, status=500, **extra):
+    """Builds an error response with a consistent {'error': ...} shape."""
+    return json_response({"error": message, **extra}, status)
+
+
+_sm_client = None
+
+
+def _get_sm_client():
+    """Returns a lazily-created, module-level Secret Manager client.
+
+    Building the client sets up a gRPC channel and loads credentials, so it
+    is created once and reused across secret fetches and warm invocations.
+    """
+    global _sm_client
+    if _sm_client is None:
+        # Imported here rather than at module scope: secretmanager drags in
+        # gRPC + protobuf, a large chunk of cold-start time that requests
+        # failing before the secret fetch never need to pay.
+        from google.cloud import secretmanager
+
+        _sm_client = secretmanager.SecretManagerServiceClient()
+    return _sm_client
+
+
+# Secrets cached for the lifetime of the function instance. Rotated secrets
+# are picked up when the instance is recycled (or on redeploy).
+_secret_cache = {}
+
+
 def get_secret(secret_name, version="latest"):
     """Retrieves a secret from Google Secret Manager."""
-    print(f"Attempting to retrieve secret: {secret_name}")
+    cache_key = (secret_name, version)
+    if cache_key in _secret_cache:
+        return _secret_cache[cache_key]
+    logger.debug("Attempting to retrieve secret: %s", secret_name)
     try:
-        client = secretmanager.SecretManagerServiceClient()
+        client = _get_sm_client()
         name = f"projects/{PROJECT_ID}/secrets/{secret_name}/versions/{version}"
         response = client.access_secret_version(request={"name": name})
         secret_value = response.payload.data.decode("UTF-8")
-        print(f"Successfully retrieved secret: {secret_name}")
+        logger.debug("Successfully retrieved secret: %s", secret_name)
+        _secret_cache[cache_key] = secret_value
         return secret_value
     except Exception as e:
-        print(f"Error retrieving secret {secret_name}: {e}")
+        logger.error("Error retrieving secret %s: %s", secret_name, e)
         raise
 
 
-def resolve_date(val):
-    """Resolve natural language date strings to YYYY-MM-DD."""
-    today = date.today()
+def get_secrets(*secret_names):
+    """Fetches several secrets concurrently, returning them in call order."""
+    with ThreadPoolExecutor(max_workers=len(secret_names)) as executor:
+        return tuple(executor.map(get_secret, secret_names))
+
+
+# API clients built once per instance; the notion-client keeps a pooled
+# httpx client underneath, so reuse also preserves its warm connections.
+_todoist_api = None
+_notion_client = None
+
+
+def get_api_clients():
+    """Returns (todoist_api, notion_client), built lazily and reused."""
+    global _todoist_api, _notion_client
+    if _todoist_api is None or _notion_client is None:
+        todoist_api_key, notion_api_key = get_secrets(TODOIST_SECRET_NAME, NOTION_SECRET_NAME)
+        _todoist_api = TodoistAPI(todoist_api_key)
+        # Tuned transport instead of the SDK default: connection-level
+        # retries, keep-alive held for the gaps between paginated calls, and
+        # timeouts aligned with the Todoist session's budget.
+        _notion_client = Client(
+            auth=notion_api_key,
+            client=httpx.Client(
+                transport=httpx.HTTPTransport(retries=3),
+                limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=60),
+                timeout=httpx.Timeout(30.0, connect=10.0),
+            ),
+        )
+    return _todoist_api, _notion_client
+
+
+# Target weekday (Monday=0) for each relative-date keyword resolve_date
+# accepts; "next week" rolls forward to the coming Monday.
+_WEEKDAY_TARGETS = {
+    "friday": 4,
+    "saturday": 5,
+    "weekend": 5,
+    "this weekend": 5,
+    "monday": 0,
+    "next week": 0,
+}
+
+
+def resolve_date(val, today=None):
+    """Resolve natural language date strings to YYYY-MM-DD.
+
+    `today` anchors relative dates; callers resolving a batch should compute
+    it once so every instruction in the batch resolves consistently.
+    """
+    if today is None:
+        today = date.today()
     v = val.lower().strip()
     if v == "today":
         return today.isoformat()
     if v == "tomorrow":
         return (today + timedelta(days=1)).isoformat()
-    if v == "friday":
-        diff = (4 - today.weekday() + 7) % 7 or 7
-        return (today + timedelta(days=diff)).isoformat()
-    if v in ("saturday", "weekend", "this weekend"):
-        diff = (5 - today.weekday() + 7) % 7 or 7
-        return (today + timedelta(days=diff)).isoformat()
-    if v in ("monday", "next week"):
-        diff = (7 - today.weekday()) % 7 or 7
+    target = _WEEKDAY_TARGETS.get(v)
+    if target is not None:
+        diff = (target - today.weekday()) % 7 or 7
         return (today + timedelta(days=diff)).isoformat()
     if len(v) == 10 and v[4] == "-" and v[7] == "-":
         return v
     return None
 
 
+# parse_instructions patterns, compiled once at import.
+_SEGMENT_RE = re.compile(r'(?<=\w)\s*,\s*(?=\d)')
+_INSTRUCTION_RE = re.compile(r'^([\d\s,]+)\s*[\u2192\->=:]+\s*(.+)$')
+_NUM_SPLIT_RE = re.compile(r'[\s,]+')
+
+
 def parse_instructions(instructions):
     """
     Parse instruction string like '1->today, 2,3->friday, 4->complete, 5->skip'
     into {task_num: action}.
     """
-    import re
     parsed = {}
-    segments = re.split(r'(?<=\w)\s*,\s*(?=\d)', instructions)
+    segments = _SEGMENT_RE.split(instructions)
     for seg in segments:
         seg = seg.strip()
-        match = re.match(r'^([\d\s,]+)\s*[\u2192\->=:]+\s*(.+)$', seg)
+        match = _INSTRUCTION_RE.match(seg)
         if match:
-            nums = re.split(r'[\s,]+', match.group(1).strip())
+            nums = _NUM_SPLIT_RE.split(match.group(1).strip())
             action = match.group(2).strip()
             for n in nums:
                 n = n.strip()
@@ -91,11 +238,150 @@ def parse_instructions(instructions):
 
 # --- Existing: sync_projects ---
 
+# /tmp survives warm instance reuse on Cloud Functions, so steady-state runs
+# (no new Todoist projects) can skip the Notion lookup query entirely.
+ID_CACHE_PATH = "/tmp/notion_project_ids.json"
+
+
+def load_known_project_ids():
+    """Loads the cached set of Todoist project IDs already synced to Notion."""
+    try:
+        with open(ID_CACHE_PATH) as f:
+            return set(json_loads(f.read()))
+    except (OSError, ValueError):
+        return set()
+
+
+def save_known_project_ids(project_ids):
+    """Persists the set of synced Todoist project IDs to the /tmp cache."""
+    try:
+        with open(ID_CACHE_PATH, "w") as f:
+            f.write(json_dumps(sorted(project_ids)))
+    except OSError as e:
+        logger.warning("Could not write project-id cache: %s", e)
+
+
+def with_notion_backoff(call, *args, max_attempts=5, **kwargs):
+    """Runs a Notion SDK call, retrying 429/5xx with exponential backoff.
+
+    A 429's Retry-After header is honored when present so transient
+    rate-limit hits become bounded waits instead of failing the whole sync.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return call(*args, **kwargs)
+        except HTTPResponseError as e:
+            if attempt == max_attempts or e.status not in (429, 500, 502, 503, 504):
+                raise
+            delay = 0.5 * (2 ** (attempt - 1))
+            if e.status == 429:
+                delay = float(e.headers.get("Retry-After", delay))
+            logger.warning("Notion returned %s; retrying in %.1fs (attempt %d/%d)", e.status, delay, attempt, max_attempts)
+            time.sleep(delay)
+
+
+def query_notion_database_all(notion_client, database_id, query_filter=None):
+    """Queries a Notion database, following pagination until exhausted.
+
+    databases.query returns at most 100 pages per call; stopping at the first
+    page silently truncates larger databases and causes duplicate creations.
+    """
+    results = []
+    cursor = None
+    while True:
+        kwargs = {"database_id": database_id, "page_size": 100}
+        if query_filter:
+            kwargs["filter"] = query_filter
+        if cursor:
+            kwargs["start_cursor"] = cursor
+        response = with_notion_backoff(notion_client.databases.query, **kwargs)
+        results.extend(response.get("results", []))
+        if not response.get("has_more"):
+            return results
+        cursor = response.get("next_cursor")
+
+
+def _norm_name(name):
+    """Normalizes a project name for matching across Todoist and Notion.
+
+    Case and surrounding-whitespace differences are benign renames; treating
+    them as distinct caused duplicate Notion pages.
+    """
+    return name.strip().casefold()
+
+
+def extract_project_keys(page):
+    """Pulls (name, todoist_id) from a Notion project page.
+
+    Direct indexing with a narrow except is cheaper than chained .get()
+    guards when the keys are present, which is the overwhelmingly common case.
+    """
+    props = page["properties"]
+    try:
+        name = props["Name"]["title"][0]["plain_text"]
+    except (KeyError, IndexError):
+        name = None
+    try:
+        todoist_id = props["Todoist Project ID"]["rich_text"][0]["plain_text"]
+    except (KeyError, IndexError):
+        todoist_id = None
+    return name, todoist_id
+
+
+# Notion-side delta cache: the per-page (name, todoist_id) index plus the
+# last query timestamp, kept in /tmp so a warm instance only fetches pages
+# edited since its previous query instead of re-downloading the database.
+PROJECT_INDEX_CACHE_PATH = "/tmp/notion_project_index.json"
+
+_PROJECT_STATUS_FILTER = {"property": "Status", "select": {"is_not_empty": True}}
+
+
+def fetch_notion_project_index(notion_client):
+    """Returns {page_id: (name, todoist_id)} for the projects database.
+
+    With a cached index from a previous run, only pages edited on or after
+    the last query timestamp are fetched and merged in; a cold instance pays
+    for the full scan once. Pages archived in Notion stay in the cached index
+    for the instance lifetime, mirroring the /tmp id-cache semantics.
+    """
+    try:
+        with open(PROJECT_INDEX_CACHE_PATH) as f:
+            cache = json_loads(f.read())
+        index = cache["pages"]
+        query_filter = {
+            "and": [
+                _PROJECT_STATUS_FILTER,
+                {
+                    "timestamp": "last_edited_time",
+                    "last_edited_time": {"on_or_after": cache["since"]},
+                },
+            ]
+        }
+    except (OSError, ValueError, KeyError):
+        index = {}
+        query_filter = _PROJECT_STATUS_FILTER
+    # Captured before the query so edits landing mid-query are re-fetched
+    # (and harmlessly re-merged) on the next run. Back-dated two minutes
+    # because Notion truncates last_edited_time to the minute: a page created
+    # seconds from now would otherwise sort before a full-precision timestamp
+    # and be dropped by the next run's on_or_after filter.
+    since = (datetime.now(timezone.utc) - timedelta(minutes=2)).isoformat()
+    for page in query_notion_database_all(notion_client, NOTION_PROJECTS_DB_ID, query_filter):
+        index[page["id"]] = extract_project_keys(page)
+    try:
+        with open(PROJECT_INDEX_CACHE_PATH, "w") as f:
+            f.write(json_dumps({"since": since, "pages": index}))
+    except OSError as e:
+        logger.warning("Could not write project index cache: %s", e)
+    return index
+
+
 def create_notion_project(notion_client, todoist_project):
     """Creates a new project page in the Notion projects database."""
-    print(f"Creating Notion project for: {todoist_project.name}")
+    logger.debug("Creating Notion project for: %s", todoist_project.name)
     try:
-        notion_client.pages.create(
+        with_notion_backoff(
+            notion_client.pages.create,
             parent={"database_id": NOTION_PROJECTS_DB_ID},
             properties={
                 "Name": {"title": [{"text": {"content": todoist_project.name}}]},
@@ -103,57 +389,93 @@ def create_notion_project(notion_client, todoist_project):
                 "Status": {"select": {"name": "Planning"}},
             },
         )
-        print(f"Successfully created Notion project: {todoist_project.name}")
+        logger.debug("Successfully created Notion project: %s", todoist_project.name)
     except Exception as e:
-        print(f"Error creating Notion project {todoist_project.name}: {e}")
+        logger.error("Error creating Notion project %s: %s", todoist_project.name, e)
         raise
 
 
 @functions_framework.http
 def sync_projects(request):
     """HTTP Cloud Function to sync Todoist projects to Notion."""
-    print("Starting Todoist to Notion project sync...")
-    try:
-        todoist_api_key = get_secret(TODOIST_SECRET_NAME)
-        notion_api_key = get_secret(NOTION_SECRET_NAME)
-    except Exception as e:
-        return (f"Error retrieving secrets: {e}", 500)
+    logger.info("Starting Todoist to Notion project sync...")
     try:
-        todoist_api = TodoistAPI(todoist_api_key)
-        notion_client = Client(auth=notion_api_key)
+        todoist_api, notion_client = get_api_clients()
     except Exception as e:
         return (f"Error initializing API clients: {e}", 500)
+    known_ids = load_known_project_ids()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        todoist_future = executor.submit(todoist_api.get_projects)
+        # On a cold id cache the Notion query is certainly needed, so start
+        # it concurrently with the Todoist fetch. With a warm cache, hold off:
+        # the cache usually lets us skip the query entirely.
+        notion_future = None
+        if not known_ids:
+            notion_future = executor.submit(fetch_notion_project_index, notion_client)
+        try:
+            todoist_projects = todoist_future.result()
+            logger.info("Retrieved %d projects from Todoist.", len(todoist_projects))
+        except Exception as e:
+            return (f"Error fetching Todoist projects: {e}", 500)
+        if not todoist_projects:
+            logger.info("No Todoist projects returned; nothing to sync.")
+            return ("Sync complete. Created: 0, Skipped/Existing: 0", 200)
+        if known_ids and all(project.id in known_ids for project in todoist_projects):
+            logger.info("All Todoist projects found in the /tmp id cache; skipping Notion query.")
+            return (
+                f"Sync complete. Created: 0, Skipped/Existing: {len(todoist_projects)}",
+                200,
+            )
+        try:
+            if notion_future is not None:
+                project_index = notion_future.result()
+            else:
+                project_index = fetch_notion_project_index(notion_client)
+        except Exception as e:
+            return (f"Error fetching Notion projects: {e}", 500)
     try:
-        todoist_projects = todoist_api.get_projects()
-        print(f"Retrieved {len(todoist_projects)} projects from Todoist.")
+        # Index by name and by Todoist Project ID in one pass, so
+        # already-synced projects are still matched (and skipped) after a
+        # rename on either side. Seeded from the /tmp id cache: it holds ids
+        # this instance created that the delta-fetched index may not have
+        # caught up with yet.
+        existing_names = set()
+        existing_todoist_ids = set(known_ids)
+        for name, todoist_id in project_index.values():
+            if name:
+                existing_names.add(_norm_name(name))
+            if todoist_id:
+                existing_todoist_ids.add(todoist_id)
+        logger.info("Found %d existing projects in Notion.", len(project_index))
     except Exception as e:
-        return (f"Error fetching Todoist projects: {e}", 500)
-    try:
-        notion_response = notion_client.databases.query(
-            database_id=NOTION_PROJECTS_DB_ID,
-            filter={"property": "Status", "select": {"is_not_empty": True}},
-        )
-        existing_notion_projects = {
-            page["properties"]["Name"]["title"][0]["plain_text"]: page
-            for page in notion_response.get("results", [])
-            if page["properties"]["Name"]["title"]
-        }
-        print(f"Found {len(existing_notion_projects)} existing projects in Notion.")
-    except Exception as e:
-        return (f"Error fetching Notion projects: {e}", 500)
+        return (f"Error indexing Notion projects: {e}", 500)
     created_count = 0
     skipped_count = 0
+    to_create = []
     for project in todoist_projects:
-        if project.name not in existing_notion_projects:
-            try:
-                create_notion_project(notion_client, project)
-                created_count += 1
-            except Exception as e:
-                print(f"Failed to create project {project.name}: {e}")
-                skipped_count += 1
+        if project.id not in existing_todoist_ids and _norm_name(project.name) not in existing_names:
+            to_create.append(project)
         else:
-            print(f"Project already exists in Notion: {project.name}")
+            logger.debug("Project already exists in Notion: %s", project.name)
             skipped_count += 1
+    # max_workers=3 keeps us under Notion's 3 req/s per-integration limit
+    # while overlapping the per-create network round trips.
+    if to_create:
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = {
+                executor.submit(create_notion_project, notion_client, project): project
+                for project in to_create
+            }
+            for future in as_completed(futures):
+                project = futures[future]
+                try:
+                    future.result()
+                    created_count += 1
+                    existing_todoist_ids.add(project.id)
+                except Exception as e:
+                    logger.error("Failed to create project %s: %s", project.name, e)
+                    skipped_count += 1
+    save_known_project_ids(existing_todoist_ids)
     return (
         f"Sync complete. Created: {created_count}, Skipped/Existing: {skipped_count}",
         200,
@@ -162,6 +484,59 @@ def sync_projects(request):
 
 # --- NEW: todoist_review ---
 
+# Incremental-sync state: the last sync_token plus the merged item snapshot,
+# kept in /tmp so warm invocations only transfer deltas from Todoist.
+SYNC_CACHE_PATH = "/tmp/todoist_sync_cache.json"
+
+
+def _post_todoist_sync(sync_token):
+    r = _todoist_session.post(
+        TODOIST_SYNC_URL,
+        json={"sync_token": sync_token, "resource_types": ["items"]},
+        timeout=REQUEST_TIMEOUT,
+    )
+    r.raise_for_status()
+    return json_loads(r.content)
+
+
+def fetch_todoist_items():
+    """Fetches all Todoist items, incrementally when a sync token is cached.
+
+    The first call on an instance pays for the full snapshot; subsequent
+    calls send the stored sync_token and only receive changed items, which
+    are merged into the cached snapshot. A rejected (stale) token falls back
+    to a full resync.
+    """
+    try:
+        with open(SYNC_CACHE_PATH) as f:
+            cache = json_loads(f.read())
+    except (OSError, ValueError):
+        cache = None
+    sync_token = cache["sync_token"] if cache else "*"
+    try:
+        data = _post_todoist_sync(sync_token)
+    except requests.HTTPError:
+        if sync_token == "*":
+            raise
+        logger.info("Stored sync_token rejected; falling back to full sync.")
+        cache = None
+        data = _post_todoist_sync("*")
+    if cache is None or data.get("full_sync", True):
+        items_by_id = {}
+    else:
+        items_by_id = cache["items"]
+    for item in data.get("items", []):
+        if item.get("is_deleted"):
+            items_by_id.pop(str(item["id"]), None)
+        else:
+            items_by_id[str(item["id"])] = item
+    try:
+        with open(SYNC_CACHE_PATH, "w") as f:
+            f.write(json_dumps({"sync_token": data.get("sync_token", "*"), "items": items_by_id}))
+    except OSError as e:
+        logger.warning("Could not write sync cache: %s", e)
+    return list(items_by_id.values())
+
 @functions_framework.http
 def todoist_review(request):
     """
@@ -170,63 +545,69 @@ def todoist_review(request):
     Returns numbered list + task_map for use with todoist_execute.
     """
     if request.method == "OPTIONS":
-        return ("", 204, {"Access-Control-Allow-Origin": "*", "Access-Control-Allow-Methods": "GET", "Access-Control-Allow-Headers": "Content-Type"})
-    headers = {"Access-Control-Allow-Origin": "*"}
+        return ("", 204, CORS_PREFLIGHT_GET)
     try:
         todoist_api_key = get_secret(TODOIST_SECRET_NAME)
+        _todoist_session.headers["Authorization"] = f"Bearer {todoist_api_key}"
     except Exception as e:
-        return (json.dumps({"error": str(e)}), 500, headers)
+        return json_error(str(e))
     try:
-        r = requests.post(
-            TODOIST_SYNC_URL,
-            headers={"Authorization": f"Bearer {todoist_api_key}"},
-            json={"sync_token": "*", "resource_types": ["items"]},
-            timeout=30,
-        )
-        r.raise_for_status()
-        data = r.json()
+        items = fetch_todoist_items()
     except Exception as e:
-        return (json.dumps({"error": f"Todoist API error: {e}"}), 500, headers)
+        return json_error(f"Todoist API error: {e}")
     today_str = date.today().isoformat()
-    tasks = [t for t in data.get("items", []) if not t.get("checked") and not t.get("is_deleted")]
-    overdue = []
-    undated = []
+    tasks = [t for t in items if not t.get("checked") and not t.get("is_deleted")]
+    # Bucket straight into per-label lists: one pass over the tasks instead
+    # of re-scanning the overdue/undated lists once per PARA label below.
+    od_by_label = {label: [] for label in PARA_LABELS}
+    ud_by_label = {label: [] for label in PARA_LABELS}
+    overdue_count = 0
+    undated_count = 0
     for t in tasks:
-        para_label = next((l for l in t.get("labels", []) if l in PARA_LABELS), None)
-        if not para_label:
+        matches = _PARA_SET.intersection(t.get("labels", ()))
+        if not matches:
             continue
-        t["_para"] = para_label
+        para_label = min(matches, key=_PARA_ORDER.get)
         if not t.get("due"):
-            undated.append(t)
+            ud_by_label[para_label].append(t)
+            undated_count += 1
         elif t["due"]["date"].split("T")[0] < today_str:
-            overdue.append(t)
+            od_by_label[para_label].append(t)
+            overdue_count += 1
+    total = overdue_count + undated_count
+    # Accumulate every fragment (header, sections, trailer) in one list and
+    # join once, instead of repeated string concatenation on the final text.
     num = 1
-    lines = []
+    parts = [
+        f"\n\U0001f5c2  TODOIST DAILY REVIEW - {today_str}\n\U0001f4cc {overdue_count} overdue | \U0001f4c5 {undated_count} undated | Total: {total}\n"
+        + "-" * 50
+    ]
     task_map = {}
+    section_gap = "\n"  # first section hugs the header; later ones get a blank line
     for label in PARA_LABELS:
-        od = [t for t in overdue if t["_para"] == label]
-        ud = [t for t in undated if t["_para"] == label]
+        od = od_by_label[label]
+        ud = ud_by_label[label]
         if od:
-            lines.append(f"\n\U0001f4cb {label} - OVERDUE")
+            parts.append(f"{section_gap}\U0001f4cb {label} - OVERDUE")
+            section_gap = "\n\n"
             for t in od:
-                lines.append(f"  {num}. [{t['due']['date']}] {t['content']}")
+                parts.append(f"\n  {num}. [{t['due']['date']}] {t['content']}")
                 task_map[str(num)] = t["id"]
                 num += 1
         if ud:
-            lines.append(f"\n\U0001f4cb {label} - NO DATE")
+            parts.append(f"{section_gap}\U0001f4cb {label} - NO DATE")
+            section_gap = "\n\n"
             for t in ud:
-                lines.append(f"  {num}. {t['content']}")
+                parts.append(f"\n  {num}. {t['content']}")
                 task_map[str(num)] = t["id"]
                 num += 1
-    total = len(overdue) + len(undated)
-    header = f"\n\U0001f5c2  TODOIST DAILY REVIEW - {today_str}\n\U0001f4cc {len(overdue)} overdue | \U0001f4c5 {len(undated)} undated | Total: {total}\n" + "-" * 50
-    text = header + "\n".join(lines)
     if total > 0:
-        text += '\n\nTell Claude your instructions, e.g.: "1->today, 2,3->friday, 4->complete, 5->skip"'
+        parts.append('\n\nTell Claude your instructions, e.g.: "1->today, 2,3->friday, 4->complete, 5->skip"')
     else:
-        text += "\n\nAll clear - nothing to review!"
-    result = {"date": today_str, "overdue_count": len(overdue), "undated_count": len(undated), "total": total, "task_map": task_map, "text": text}
-    return (json.dumps(result), 200, {**headers, "Content-Type": "application/json"})
+        parts.append("\n\nAll clear - nothing to review!")
+    text = "".join(parts)
+    result = {"date": today_str, "overdue_count": overdue_count, "undated_count": undated_count, "total": total, "task_map": task_map, "text": text}
+    return json_response(result)
 
 
 # --- NEW: todoist_execute ---
@@ -239,21 +620,24 @@ def todoist_execute(request):
     Body: {"instructions": "1->today, 2->friday", "task_map": {"1": "task_id", ...}}
     """
     if request.method == "OPTIONS":
-        return ("", 204, {"Access-Control-Allow-Origin": "*", "Access-Control-Allow-Methods": "POST", "Access-Control-Allow-Headers": "Content-Type"})
-    headers = {"Access-Control-Allow-Origin": "*", "Content-Type": "application/json"}
+        return ("", 204, CORS_PREFLIGHT_POST)
     try:
         body = request.get_json(force=True)
     except Exception:
-        return (json.dumps({"error": "Invalid JSON body"}), 400, headers)
+        return json_error("Invalid JSON body", 400)
     if not body or "instructions" not in body or "task_map" not in body:
-        return (json.dumps({"error": "Required: 'instructions' and 'task_map'"}), 400, headers)
+        return json_error("Required: 'instructions' and 'task_map'", 400)
     instructions = body["instructions"]
-    task_map = body["task_map"]
+    # Normalize once so int and str keys both work, instead of coercing
+    # inside the lookup loop.
+    task_map = {str(k): v for k, v in body["task_map"].items()}
     try:
         todoist_api_key = get_secret(TODOIST_SECRET_NAME)
+        _todoist_session.headers["Authorization"] = f"Bearer {todoist_api_key}"
     except Exception as e:
-        return (json.dumps({"error": str(e)}), 500, headers)
+        return json_error(str(e))
     parsed = parse_instructions(instructions)
+    today = date.today()
     commands = []
     results = []
     for num_str, action in parsed.items():
@@ -272,28 +656,23 @@ def todoist_execute(request):
             commands.append({"type": "item_update", "uuid": cmd_uuid, "args": {"id": task_id, "due": None}})
             results.append(f"  #{num_str}: date removed")
         else:
-            resolved = resolve_date(action)
+            resolved = resolve_date(action, today)
             if resolved:
                 commands.append({"type": "item_update", "uuid": cmd_uuid, "args": {"id": task_id, "due": {"date": resolved}}})
                 results.append(f"  #{num_str}: -> {resolved}")
             else:
                 results.append(f"  #{num_str}: unknown action '{action}'")
     if not commands:
-        return (json.dumps({"commands_sent": 0, "all_ok": True, "results": results}), 200, headers)
+        return json_response({"commands_sent": 0, "all_ok": True, "results": results})
     try:
-        r = requests.post(
+        r = _todoist_session.post(
             TODOIST_SYNC_URL,
-            headers={"Authorization": f"Bearer {todoist_api_key}"},
             json={"commands": commands},
-            timeout=30,
+            timeout=REQUEST_TIMEOUT,
         )
         r.raise_for_status()
-        sync_resp = r.json()
+        sync_resp = json_loads(r.content)
     except Exception as e:
-        return (json.dumps({"error": f"Todoist API error: {e}", "results": results}), 500, headers)
+        return json_error(f"Todoist API error: {e}", results=results)
     all_ok = all(v == "ok" for v in sync_resp.get("sync_status", {}).values())
-    return (
-        json.dumps({"commands_sent": len(commands), "all_ok": all_ok, "sync_status": sync_resp.get("sync_status"), "results": results}),
-        200,
-        headers,
-    )
+    return json_response({"commands_sent": len(commands), "all_ok": all_ok, "sync_status": sync_resp.get("sync_status"), "results": results})